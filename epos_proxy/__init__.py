@@ -1,3 +1,7 @@
 """epos-proxy - Epson ePOS Printer Proxy"""
 
+import logging
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
 __version__ = "0.1.0"
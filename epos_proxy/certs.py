@@ -1,15 +1,70 @@
 """SSL certificate generation."""
 
+import datetime
+import ipaddress
 import os
 import socket
-import subprocess
+import tempfile
 
-from epos_proxy.config import CERT_FILE, DEFAULT_HOST, KEY_FILE, config
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from epos_proxy.config import (
+    CERT_FILE,
+    CERT_RENEW_DAYS,
+    CERT_VALID_DAYS,
+    DEFAULT_HOST,
+    KEY_FILE,
+    config,
+)
+
+
+def _san_entry(name: str) -> x509.GeneralName:
+    """Build a subjectAltName entry for an IP address or host name."""
+    try:
+        return x509.IPAddress(ipaddress.ip_address(name))
+    except ValueError:
+        return x509.DNSName(name)
+
+
+def _cert_is_current() -> bool:
+    """Check the existing cert matches its key and is valid for CERT_RENEW_DAYS."""
+    try:
+        with open(CERT_FILE, "rb") as f:
+            cert = x509.load_pem_x509_certificate(f.read())
+        with open(KEY_FILE, "rb") as f:
+            key = serialization.load_pem_private_key(f.read(), password=None)
+    except (OSError, TypeError, ValueError):
+        return False
+
+    # A key left over from an interrupted renewal would fail every handshake
+    spki = (serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    if key.public_key().public_bytes(*spki) != cert.public_key().public_bytes(*spki):
+        return False
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return cert.not_valid_after_utc - now >= datetime.timedelta(days=CERT_RENEW_DAYS)
+
+
+def _write_file(path: str, data: bytes, mode: int):
+    """Write a file via a temp file and rename, so it is never left half-written."""
+    # mkstemp creates the file owner-only, before any data is written
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
 def generate_self_signed_cert() -> bool:
-    """Generate a self-signed certificate for HTTPS."""
-    if os.path.exists(CERT_FILE) and os.path.exists(KEY_FILE):
+    """Generate a self-signed certificate for HTTPS, unless a current one exists."""
+    if _cert_is_current():
         print(f"Using existing certificates: {CERT_FILE}, {KEY_FILE}")
         return True
 
@@ -25,19 +80,39 @@ def generate_self_signed_cert() -> bool:
     if host == "0.0.0.0":
         host = local_ip
 
-    # Generate certificate with SAN for IP address
-    cmd = f"""openssl req -x509 -newkey rsa:2048 -keyout {KEY_FILE} -out {CERT_FILE} \
-        -days 365 -nodes \
-        -subj "/CN=PrinterProxy" \
-        -addext "subjectAltName=IP:127.0.0.1,IP:{local_ip},IP:{host}" """
+    # Generate key and certificate in-process, with SAN for the IP addresses.
+    # ECDSA P-256 signs TLS handshakes far faster than RSA-2048.
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "PrinterProxy")])
+    alt_names = list(dict.fromkeys(["127.0.0.1", local_ip, host]))
+    now = datetime.datetime.now(datetime.timezone.utc)
 
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=CERT_VALID_DAYS))
+        .add_extension(
+            x509.SubjectAlternativeName([_san_entry(n) for n in alt_names]),
+            critical=False,
+        )
+        .sign(key, hashes.SHA256())
+    )
 
-    if result.returncode != 0:
-        # Fallback for older OpenSSL without -addext
-        cmd = f"""openssl req -x509 -newkey rsa:2048 -keyout {KEY_FILE} -out {CERT_FILE} \
-            -days 365 -nodes -subj "/CN={host}" """
-        subprocess.run(cmd, shell=True)
+    # Private key is only readable by the owner
+    _write_file(
+        KEY_FILE,
+        key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.NoEncryption(),
+        ),
+        0o600,
+    )
+    _write_file(CERT_FILE, cert.public_bytes(serialization.Encoding.PEM), 0o644)
 
     print("Certificate generated!")
     return True
@@ -1,13 +1,17 @@
 """Command-line interface."""
 
 import argparse
+import functools
+import logging
+import sys
 
 from epos_proxy.config import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_RECEIPT_WIDTH, config
 from epos_proxy.server import run_server
 
 
-def main():
-    """Main entry point with CLI argument parsing."""
+@functools.lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser (once; parsing does not mutate it)."""
     parser = argparse.ArgumentParser(
         prog="epos-proxy",
         description="Epson ePOS Printer Proxy - Receive ePOS requests and print to a thermal printer",
@@ -68,7 +72,30 @@ Other Options:
         help=f"Receipt width in pixels (default: {DEFAULT_RECEIPT_WIDTH})",
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Log request and printer details for every job",
+    )
+
+    return parser
+
+
+def main(argv=None):
+    """Main entry point with CLI argument parsing."""
+    args = _build_parser().parse_args(argv)
+
+    # Configure only our own loggers; escpos and pyusb log through the root
+    # logger and stay at its default WARNING level
+    log = logging.getLogger("epos_proxy")
+    log.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    log.propagate = False
+    if not any(isinstance(h, logging.StreamHandler) for h in log.handlers):
+        # stdout, alongside the startup banner and certificate messages
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
 
     # Store config globally
     config["host"] = args.host
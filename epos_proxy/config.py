@@ -3,6 +3,7 @@
 # Server defaults
 DEFAULT_HOST = "0.0.0.0"
 DEFAULT_PORT = 8000
+REQUEST_TIMEOUT = 30  # seconds a client may stall before its connection is dropped
 
 # Printer defaults
 DEFAULT_RECEIPT_WIDTH = 576  # 80mm paper at 203dpi
@@ -11,11 +12,19 @@ DEFAULT_PRINTER_DEVICE = "/dev/usb/lp0"  # Linux default
 # SSL certificate files
 CERT_FILE = "server.crt"
 KEY_FILE = "server.key"
+CERT_VALID_DAYS = 365
+CERT_RENEW_DAYS = 30  # Regenerate when fewer days of validity remain
 
 # Reconnection settings
 MAX_RETRIES = 3
 RETRY_DELAY = 1  # seconds
 
+# TCP keepalive for network printers: a dead peer is noticed after about
+# KEEPALIVE_IDLE + KEEPALIVE_INTERVAL * KEEPALIVE_COUNT seconds of silence
+KEEPALIVE_IDLE = 30  # seconds
+KEEPALIVE_INTERVAL = 10  # seconds
+KEEPALIVE_COUNT = 3
+
 # Runtime configuration (populated by CLI)
 config = {
     "host": DEFAULT_HOST,
@@ -1,24 +1,52 @@
 """Printer connection management and ESC/POS commands."""
 
+import logging
 import platform
 import re
+import socket
+import struct
 import sys
+import threading
 import time
 from functools import wraps
 
-from escpos.printer import File, Network, Usb
-
 from epos_proxy.config import (
     DEFAULT_PRINTER_DEVICE,
     DEFAULT_RECEIPT_WIDTH,
+    KEEPALIVE_COUNT,
+    KEEPALIVE_IDLE,
+    KEEPALIVE_INTERVAL,
     MAX_RETRIES,
     RETRY_DELAY,
     config,
 )
 
+log = logging.getLogger(__name__)
+
+# Network printer address: IPv4 with optional port
+_IPV4_RE = re.compile(r"^\d+\.\d+\.\d+\.\d+(:\d+)?$")
+
+# GS v 0 raster dimensions: xL xH yL yH (little-endian width bytes, height)
+_RASTER_DIMS = struct.Struct("<HH")
+
+# Keepalive timers, set where the platform supports them (the kernel
+# default is about two hours idle before the first probe)
+_KEEPALIVE_OPTS = [
+    (getattr(socket, name), value)
+    for name, value in (
+        ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+        ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+        ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+    )
+    if hasattr(socket, name)
+]
+
 # Global printer instance
 _printer = None
 
+# Serializes access to the printer across request handler threads
+_printer_lock = threading.Lock()
+
 
 def reset_printer():
     """Reset the printer connection."""
@@ -31,30 +59,49 @@ def reset_printer():
         _printer = None
 
 
+def check_printer_device():
+    """Exit with usage help if the platform needs a printer device and none is set."""
+    if config.get("printer_device") or platform.system() != "Windows":
+        return
+
+    log.error("Error: On Windows, you must specify a printer device.")
+    log.error("  Use --printer with one of:")
+    log.error("    - 192.168.1.87        (Network printer IP, recommended)")
+    log.error("    - 192.168.1.87:9100   (Network printer IP:port)")
+    log.error("    - USB:0x04b8:0x0202   (USB vendor:product IDs in hex)")
+    log.error("    - COM3                (Serial port)")
+    sys.exit(1)
+
+
 def create_printer():
     """Create a new printer instance based on platform and config."""
-    system = platform.system()
+    # Imported here: escpos pulls in pyusb, pyserial and Pillow, which
+    # are not needed until a print job arrives
+    from escpos.printer import File, Network, Usb
+
     device = config.get("printer_device")
 
     if not device:
-        if system == "Windows":
-            print("Error: On Windows, you must specify a printer device.")
-            print("  Use --printer with one of:")
-            print("    - 192.168.1.87        (Network printer IP, recommended)")
-            print("    - 192.168.1.87:9100   (Network printer IP:port)")
-            print("    - USB:0x04b8:0x0202   (USB vendor:product IDs in hex)")
-            print("    - COM3                (Serial port)")
-            sys.exit(1)
-        else:
-            device = DEFAULT_PRINTER_DEVICE
+        # Runs on a request thread, where sys.exit would only end the thread;
+        # check_printer_device() exits at startup instead
+        if platform.system() == "Windows":
+            raise RuntimeError("No printer device specified (use --printer)")
+        device = DEFAULT_PRINTER_DEVICE
 
     # Network printer (IP address or IP:port)
-    if re.match(r"^\d+\.\d+\.\d+\.\d+(:\d+)?$", device):
+    if _IPV4_RE.match(device):
         if ":" in device:
             host, port = device.rsplit(":", 1)
-            return Network(host, int(port))
+            printer = Network(host, int(port))
         else:
-            return Network(device)  # Default port 9100
+            printer = Network(device)  # Default port 9100
+        # Let TCP keepalive detect a silently dead peer within a minute or so
+        printer.device.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in _KEEPALIVE_OPTS:
+            printer.device.setsockopt(socket.IPPROTO_TCP, option, value)
+        # Send the cut right after the raster instead of waiting on Nagle
+        printer.device.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return printer
 
     # USB by vendor:product ID
     if device.startswith("USB:"):
@@ -85,24 +132,31 @@ def get_printer():
 
 
 def with_reconnect(func):
-    """Decorator to handle printer reconnection on failure."""
+    """Decorator to serialize printer access and reconnect on failure."""
 
     @wraps(func)
     def wrapper(*args, **kwargs):
         last_error = None
 
-        for attempt in range(MAX_RETRIES):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                last_error = e
-                error_type = type(e).__name__
-                error_msg = str(e) or "(no message)"
-                print(f"  Error (attempt {attempt + 1}/{MAX_RETRIES}): [{error_type}] {error_msg}")
-                reset_printer()
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(RETRY_DELAY)
-                    print("  Reconnecting...")
+        with _printer_lock:
+            for attempt in range(MAX_RETRIES):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    last_error = e
+                    log.warning(
+                        "  Error (attempt %d/%d): [%s] %s",
+                        attempt + 1,
+                        MAX_RETRIES,
+                        type(e).__name__,
+                        str(e) or "(no message)",
+                    )
+                    # Always reconnect: after a failed write the printer may
+                    # hold part of a command, so the stream can't be reused
+                    reset_printer()
+                    if attempt < MAX_RETRIES - 1:
+                        time.sleep(RETRY_DELAY)
+                        log.info("  Reconnecting...")
 
         raise last_error
 
@@ -117,8 +171,8 @@ def kick_drawer(pin: int = 0) -> bool:
     # m: pin (0 or 1)
     # t1: pulse on time (units of 2ms), 25 = 50ms
     # t2: pulse off time (units of 2ms), 25 = 50ms
-    p._raw(bytes([0x1B, 0x70, pin & 1, 25, 25]))
-    print(f"  Drawer kicked (pin {pin})")
+    p._raw(struct.pack("5B", 0x1B, 0x70, pin & 1, 25, 25))
+    log.info("  Drawer kicked (pin %d)", pin)
     return True
 
 
@@ -129,7 +183,11 @@ def print_receipt(image_data: bytes, width: int, height: int) -> bool:
 
     # Calculate width in bytes
     width_bytes = width // 8
-    raster_data = image_data[: width_bytes * height]
+    raster_size = width_bytes * height
+    if len(image_data) == raster_size:
+        raster_data = image_data
+    else:
+        raster_data = memoryview(image_data)[:raster_size]  # Trim without copying
 
     # Get printer paper width for centering
     paper_width = config.get("receipt_width", DEFAULT_RECEIPT_WIDTH)
@@ -138,38 +196,42 @@ def print_receipt(image_data: bytes, width: int, height: int) -> bool:
     # Center the image if narrower than paper
     if width < paper_width:
         padding_bytes = (paper_width_bytes - width_bytes) // 2
-        centered_data = bytearray()
-
-        for y in range(height):
-            row_start = y * width_bytes
-            row_end = row_start + width_bytes
-            row_data = raster_data[row_start:row_end]
-
-            # Pad left, add row, pad right
-            centered_data.extend(b"\x00" * padding_bytes)
-            centered_data.extend(row_data)
-            centered_data.extend(
-                b"\x00" * (paper_width_bytes - width_bytes - padding_bytes)
-            )
-
-        raster_data = bytes(centered_data)
+        if len(raster_data) < raster_size:
+            raster_data = bytes(raster_data).ljust(raster_size, b"\x00")
+        centered_data = bytearray(paper_width_bytes * height)
+
+        # Copy one byte column at a time with strided slices, so the
+        # Python-level loop runs width_bytes times instead of height times
+        for x in range(width_bytes):
+            centered_data[padding_bytes + x :: paper_width_bytes] = raster_data[
+                x :: width_bytes
+            ]
+
+        raster_data = centered_data  # Joined into the command as-is, no copy
         width_bytes = paper_width_bytes
-        print(f"  Centered: {width}px -> {paper_width}px (padding: {padding_bytes * 8}px)")
-
-    # GS v 0 - Print raster bit image
-    xL = width_bytes & 0xFF
-    xH = (width_bytes >> 8) & 0xFF
-    yL = height & 0xFF
-    yH = (height >> 8) & 0xFF
-
-    # Send raster graphics command
-    p._raw(b"\x1d\x76\x30\x00")  # GS v 0 m (m=0 normal)
-    p._raw(bytes([xL, xH, yL, yH]))
-    p._raw(raster_data)
+        log.debug(
+            "  Centered: %dpx -> %dpx (padding: %dpx)",
+            width,
+            paper_width,
+            padding_bytes * 8,
+        )
+    elif width > paper_width:
+        log.warning("  Image is wider than the paper (%dpx > %dpx)", width, paper_width)
+
+    # GS v 0 - Print raster bit image, then feed, in a single write
+    p._raw(
+        b"".join(
+            (
+                b"\x1d\x76\x30\x00",  # GS v 0 m (m=0 normal)
+                _RASTER_DIMS.pack(width_bytes, height),
+                raster_data,
+                b"\x1b\x64\x06",  # ESC d 6 - Feed 6 lines
+            )
+        )
+    )
 
-    # Feed and cut
-    p._raw(b"\x1b\x64\x06")  # ESC d 6 - Feed 6 lines
+    # Cut
     p.cut()
 
-    print(f"  Sent {len(raster_data)} bytes to printer")
+    log.debug("  Sent %d bytes to printer", len(raster_data))
     return True
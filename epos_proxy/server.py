@@ -1,37 +1,97 @@
 """HTTP server and request handler for ePOS requests."""
 
-import base64
+import binascii
+import logging
 import platform
 import re
 import ssl
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-from epos_proxy.certs import generate_self_signed_cert
 from epos_proxy.config import (
     CERT_FILE,
     DEFAULT_PRINTER_DEVICE,
     DEFAULT_RECEIPT_WIDTH,
     KEY_FILE,
+    REQUEST_TIMEOUT,
     config,
 )
-from epos_proxy.printer import kick_drawer, print_receipt
+from epos_proxy.printer import check_printer_device, kick_drawer, print_receipt
+
+log = logging.getLogger(__name__)
+
+# ePOS XML patterns (matched against the raw request body)
+_PULSE_RE = re.compile(rb"<pulse\s*([^/]*)/?\s*>")
+_DRAWER_RE = re.compile(rb'drawer=["\']?(\d+)["\']?')
+_WIDTH_RE = re.compile(rb'width=["\']?(\d+)["\']?')
+_HEIGHT_RE = re.compile(rb'height=["\']?(\d+)["\']?')
+
+# EPSON ePOS response format
+_RESPONSE_BODY = b"""<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+<s:Body>
+<response success="true" code="" status="123456" battery="0"/>
+</s:Body>
+</s:Envelope>"""
+_RESPONSE_LEN = str(len(_RESPONSE_BODY))
+
+# Health check response
+_HEALTH_BODY = b"Printer proxy running"
+_HEALTH_LEN = str(len(_HEALTH_BODY))
+
+# CORS headers that do not depend on the request
+_CORS_HEADERS = (
+    ("Access-Control-Allow-Methods", "GET, POST, OPTIONS"),
+    ("Access-Control-Allow-Headers", "*"),
+    ("Access-Control-Allow-Credentials", "true"),
+    ("Access-Control-Max-Age", "86400"),
+)
+
+
+def _find_image(data: bytes):
+    """Return (tag_start, payload_start, payload_end) of the first <image>, or None."""
+    # Plain substring searches keep the (possibly multi-megabyte) base64
+    # payload out of the regex engine and out of a match group
+    tag_start = data.find(b"<image")
+    if tag_start < 0:
+        return None
+    payload_start = data.find(b">", tag_start) + 1
+    if payload_start == 0:
+        return None
+    payload_end = data.find(b"</image>", payload_start)
+    if payload_end < 0:
+        return None
+    return tag_start, payload_start, payload_end
 
 
 class PrinterProxy(BaseHTTPRequestHandler):
     """HTTP request handler for Epson ePOS print requests."""
 
+    # Set TCP_NODELAY on each connection so the response isn't held by Nagle
+    disable_nagle_algorithm = True
+
+    # A stalled client only holds its own thread, and only for this long
+    timeout = REQUEST_TIMEOUT
+
+    def handle(self):
+        """Complete the TLS handshake (HTTPS) on this thread, then serve requests."""
+        if isinstance(self.connection, ssl.SSLSocket):
+            try:
+                self.connection.do_handshake()
+            except OSError as e:
+                log.debug("  TLS handshake failed: %s", e)
+                return
+        super().handle()
+
     def send_cors_headers(self):
         """Send CORS headers for all responses."""
         origin = self.headers.get("Origin", "*")
         self.send_header("Access-Control-Allow-Origin", origin)
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "*")
-        self.send_header("Access-Control-Allow-Credentials", "true")
-        self.send_header("Access-Control-Max-Age", "86400")
+        for keyword, value in _CORS_HEADERS:
+            self.send_header(keyword, value)
 
     def do_OPTIONS(self):
         """Handle CORS preflight request."""
-        print(f"  OPTIONS request from {self.headers.get('Origin')}")
+        log.debug("  OPTIONS request from %s", self.headers.get("Origin"))
         self.send_response(200)
         self.send_cors_headers()
         self.send_header("Content-Length", "0")
@@ -42,50 +102,66 @@ class PrinterProxy(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_cors_headers()
         self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", _HEALTH_LEN)
         self.end_headers()
-        self.wfile.write(b"Printer proxy running")
+        self.wfile.write(_HEALTH_BODY)
 
     def do_POST(self):
         """Handle POST requests - print jobs."""
         try:
             content_length = int(self.headers.get("Content-Length", 0))
-            post_data = self.rfile.read(content_length).decode("utf-8")
+            post_data = self.rfile.read(content_length)
+
+            log.info("[REQUEST] Received %d bytes", len(post_data))
+            log.debug("  Path: %s", self.path)
+            log.debug("  Origin: %s", self.headers.get("Origin"))
 
-            print(f"\n[REQUEST] Received {len(post_data)} bytes")
-            print(f"  Path: {self.path}")
-            print(f"  Origin: {self.headers.get('Origin')}")
+            image_span = _find_image(post_data)
 
-            # Check for drawer kick (pulse) command
-            pulse_match = re.search(r"<pulse\s*([^/]*)/?\s*>", post_data)
+            # Check for drawer kick (pulse) command, skipping over the
+            # base64 image payload rather than running the regex through it
+            if image_span:
+                pulse_match = _PULSE_RE.search(post_data, 0, image_span[0])
+                if not pulse_match:
+                    pulse_match = _PULSE_RE.search(post_data, image_span[2])
+            else:
+                pulse_match = _PULSE_RE.search(post_data)
             if pulse_match:
                 # Extract drawer pin if specified (default pin 0)
                 attrs = pulse_match.group(1)
-                pin_match = re.search(r'drawer=["\']?(\d+)["\']?', attrs)
+                pin_match = _DRAWER_RE.search(attrs)
                 pin = int(pin_match.group(1)) if pin_match else 0
-                print(f"  Drawer kick command (pin {pin})")
+                log.debug("  Drawer kick command (pin %d)", pin)
                 try:
                     kick_drawer(pin)
                 except Exception as e:
-                    print(f"  Drawer kick failed: {e}")
+                    log.error("  Drawer kick failed: %s", e)
 
-            image_match = re.search(
-                r"<image[^>]*>(.*?)</image>", post_data, re.DOTALL
-            )
+            width = height = None
 
-            width_match = re.search(r'width=["\']?(\d+)["\']?', post_data)
-            width = int(width_match.group(1)) if width_match else None
+            if image_span:
+                # Dimensions are attributes of the <image> start tag, so only
+                # that short slice is searched
+                tag_start, start, end = image_span
+                image_tag = post_data[tag_start:start]
 
-            height_match = re.search(r'height=["\']?(\d+)["\']?', post_data)
-            height = int(height_match.group(1)) if height_match else None
+                width_match = _WIDTH_RE.search(image_tag)
+                width = int(width_match.group(1)) if width_match else None
 
-            print(f"  Dimensions: {width}x{height}")
+                height_match = _HEIGHT_RE.search(image_tag)
+                height = int(height_match.group(1)) if height_match else None
 
-            if image_match:
-                print("  Decoding image data...")
-                b64_string = image_match.group(1).strip()
-                raw_data = base64.b64decode(b64_string)
+            log.debug("  Dimensions: %sx%s", width, height)
 
-                print(f"  Raw data: {len(raw_data)} bytes")
+            if image_span:
+                log.debug("  Decoding image data...")
+                # Decode straight from a view of the body: no copy of the
+                # base64 text, and a2b_base64 skips surrounding whitespace
+                with memoryview(post_data) as view:
+                    raw_data = binascii.a2b_base64(view[start:end])
+                del post_data  # Only the decoded image is needed from here on
+
+                log.debug("  Raw data: %d bytes", len(raw_data))
 
                 # Determine dimensions if not provided
                 if not width:
@@ -97,34 +173,23 @@ class PrinterProxy(BaseHTTPRequestHandler):
                 if width and height:
                     try:
                         print_receipt(raw_data, width, height)
-                        print(f"  Printed successfully ({width}x{height})")
+                        log.info("  Printed successfully (%dx%d)", width, height)
                     except Exception as e:
-                        print(f"  Print failed: {e}")
+                        log.error("  Print failed: %s", e)
                 else:
-                    print("  Could not determine image dimensions")
+                    log.warning("  Could not determine image dimensions")
             elif not pulse_match:
-                print("  No image data (unhandled command)")
-
-            # EPSON ePOS response format
-            response = b"""<?xml version="1.0" encoding="utf-8"?>
-<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
-<s:Body>
-<response success="true" code="" status="123456" battery="0"/>
-</s:Body>
-</s:Envelope>"""
+                log.info("  No image data (unhandled command)")
 
             self.send_response(200)
             self.send_cors_headers()
             self.send_header("Content-Type", "text/xml; charset=utf-8")
-            self.send_header("Content-Length", str(len(response)))
+            self.send_header("Content-Length", _RESPONSE_LEN)
             self.end_headers()
-            self.wfile.write(response)
+            self.wfile.write(_RESPONSE_BODY)
 
-        except Exception as e:
-            print(f"  Error: {e}")
-            import traceback
-
-            traceback.print_exc()
+        except Exception:
+            log.exception("  Error handling request")
 
             self.send_response(500)
             self.send_cors_headers()
@@ -134,18 +199,39 @@ class PrinterProxy(BaseHTTPRequestHandler):
         pass  # Suppress default logging
 
 
+def _make_ssl_context(cert_file: str, key_file: str) -> ssl.SSLContext:
+    """Create the server TLS context."""
+    # Secure server defaults; session tickets let returning clients resume
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    # TLS 1.2 fallback: ECDHE with AEAD only (TLS 1.3 suites are unaffected)
+    context.set_ciphers("ECDHE+AESGCM:ECDHE+CHACHA20")
+    context.load_cert_chain(cert_file, key_file)
+    return context
+
+
 def run_server(host: str, port: int, use_https: bool):
     """Start the printer proxy server."""
+    # Exit from the main thread; request threads can't stop the server
+    check_printer_device()
+
     server_address = (host, port)
-    httpd = HTTPServer(server_address, PrinterProxy)
+    # Each request gets its own (daemon) thread; printer access is
+    # serialized in epos_proxy.printer
+    httpd = ThreadingHTTPServer(server_address, PrinterProxy)
 
     protocol = "http"
 
     if use_https:
+        # Only needed for HTTPS; cryptography is slow to import
+        from epos_proxy.certs import generate_self_signed_cert
+
         generate_self_signed_cert()
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        context.load_cert_chain(CERT_FILE, KEY_FILE)
-        httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+        context = _make_ssl_context(CERT_FILE, KEY_FILE)
+        # Handshake in the request thread (PrinterProxy.handle), not in
+        # accept(), so a slow or silent client can't block the serve loop
+        httpd.socket = context.wrap_socket(
+            httpd.socket, server_side=True, do_handshake_on_connect=False
+        )
         protocol = "https"
 
     # Get display address